@@ -0,0 +1,164 @@
+"""
+On-disk bar storage. Each (symbol, timeframe) series
+is a directory of fixed-width column files plus a
+header holding the bar count. Columns are opened with
+mmap, so any number of processes share one page-cached
+copy of the history and opening a series is instant.
+
+Layout:
+<root>/<symbol>/<timeframe>/header
+<root>/<symbol>/<timeframe>/<column>.bin
+
+Series are append-only. The header is replaced
+atomically after the columns are written and synced
+to disk, so readers never see a partially appended
+bar, even after a power loss.
+NOTE: There should be a single writer per series.
+"""
+import calendar
+import os
+import struct
+from datetime import datetime
+import numpy as np
+
+MAGIC = b"BARS"
+VERSION = 1
+HEADER = struct.Struct("<4sIQ") # magic, version, bar count
+
+# Same names and types as the rates MetaTrader 5 returns
+COLUMNS = [('time', np.dtype('<i8')), # bar open time in seconds since epoch (UTC)
+			('open', np.dtype('<f8')),
+			('high', np.dtype('<f8')),
+			('low', np.dtype('<f8')),
+			('close', np.dtype('<f8')),
+			('tick_volume', np.dtype('<u8')),
+			('spread', np.dtype('<i4')),
+			('real_volume', np.dtype('<u8'))]
+
+
+"""
+Converts a datetime into seconds since epoch.
+Naive datetimes are taken to be in UTC.
+"""
+def to_seconds(date):
+	if not isinstance(date, datetime):
+		return int(date)
+	if date.tzinfo is None:
+		return calendar.timegm(date.timetuple())
+	return int(date.timestamp())
+
+
+class BarStore:
+	def __init__(self, root):
+		self.root = root
+
+	def series_path(self, symbol, tf):
+		return os.path.join(self.root, symbol, str(tf))
+
+	def has(self, symbol, tf):
+		return os.path.exists(os.path.join(self.series_path(symbol, tf), "header"))
+
+	def open(self, symbol, tf):
+		return BarSeries(self.series_path(symbol, tf))
+
+	"""
+	Appends bars to a series, creating it if needed.
+	rates can be anything indexable by column name
+	(MT5 rates array, DataFrame, dict of arrays) and
+	must be sorted by time. Bars that aren't newer than
+	the last stored bar are skipped. Returns the number
+	of bars appended.
+	"""
+	def append(self, symbol, tf, rates):
+		path = self.series_path(symbol, tf)
+		os.makedirs(path, exist_ok=True)
+		count = read_count(path) if self.has(symbol, tf) else 0
+
+		times = np.asarray(rates['time'])
+		if np.issubdtype(times.dtype, np.datetime64):
+			times = times.astype('datetime64[s]').astype(np.int64)
+
+		start = 0
+		if count > 0:
+			last = BarSeries(path).time[-1]
+			start = int(np.searchsorted(times, last, side='right'))
+		new = len(times) - start
+		if new <= 0:
+			return 0
+
+		for name, dtype in COLUMNS:
+			values = times if name == 'time' else np.asarray(rates[name])
+			col_path = os.path.join(path, name + ".bin")
+			with open(col_path, "ab") as file:
+				# Drop whatever an interrupted append left past the last committed bar
+				file.truncate(count * dtype.itemsize)
+				file.write(np.ascontiguousarray(values[start:], dtype=dtype).tobytes())
+				# The header must not count bars that aren't on disk yet
+				file.flush()
+				os.fsync(file.fileno())
+
+		write_count(path, count + new)
+		return new
+
+
+"""
+A read-only, memory-mapped view of one series.
+Reopen it to see bars appended after it was opened.
+"""
+class BarSeries:
+	def __init__(self, path):
+		self.path = path
+		self.count = read_count(path)
+		self.columns = {}
+		for name, dtype in COLUMNS:
+			if self.count == 0:
+				self.columns[name] = np.empty(0, dtype=dtype)
+				continue
+			self.columns[name] = np.memmap(os.path.join(path, name + ".bin"),
+											dtype=dtype, mode='r', shape=(self.count,))
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, name):
+		return self.columns[name]
+
+	@property
+	def time(self):
+		return self.columns['time']
+
+	"""
+	Returns the index range of bars opened in
+	[start_date, end_date] using binary search.
+	"""
+	def index_range(self, start_date, end_date):
+		lo = int(np.searchsorted(self.time, to_seconds(start_date), side='left'))
+		hi = int(np.searchsorted(self.time, to_seconds(end_date), side='right'))
+		return lo, max(lo, hi)
+
+	"""
+	Returns {<column> : <array>} of bars opened in
+	[start_date, end_date]. Arrays are views into the
+	mapped files, nothing is copied.
+	"""
+	def range(self, start_date, end_date):
+		lo, hi = self.index_range(start_date, end_date)
+		return {name: col[lo:hi] for name, col in self.columns.items()}
+
+
+def read_count(path):
+	with open(os.path.join(path, "header"), "rb") as file:
+		magic, version, count = HEADER.unpack(file.read(HEADER.size))
+
+	if magic != MAGIC or version != VERSION:
+		raise ValueError("Not a bar series: " + path)
+
+	return count
+
+def write_count(path, count):
+	tmp_path = os.path.join(path, "header.tmp")
+	with open(tmp_path, "wb") as file:
+		file.write(HEADER.pack(MAGIC, VERSION, count))
+		file.flush()
+		os.fsync(file.fileno())
+	os.replace(tmp_path, os.path.join(path, "header"))
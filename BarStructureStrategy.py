@@ -1,7 +1,9 @@
 """
 Implements a simgple strategy for exploration.
 """
+import functools
 import StrategySuite as ss
+import BarStructures as structs
 
 class BarStructureStrategy(ss.Strategy):
 	def __init__(self, tf_to_struct, wait_count, reverse=False):
@@ -10,6 +12,8 @@ class BarStructureStrategy(ss.Strategy):
 		# <timeframe> : [<buy_cond>, <sell_cond>]
 		self.tf_to_struct = tf_to_struct
 
+		# Bars of the position's TF to hold a position for,
+		# either one count or <timeframe> : <count>
 		self.wait_count = wait_count
 		self.reverse = reverse # Reverses buys and sells
 
@@ -26,18 +30,14 @@ class BarStructureStrategy(ss.Strategy):
 			if self.pos_tf in new_tfs:
 				self.post_entry_bar_count += 1
 
-				if self.post_entry_bar_count == self.wait_count:
-					exit = self.bars[self.pos_tf][-1].close
-					if self.positions[0].type == "sell":
-						pass
-						# exit += stf_bars[-1].spread*0.00001
-						# exit += self.bars[self.pos_tf][-1].spread*0.000002
-					if self.positions[0].type == "buy":
-						pass
-						# exit -= self.bars[self.pos_tf][-1].spread*0.00001
-						# exit -= self.bars[self.pos_tf][-1].spread*0.000002
-
-					self.close_position(self.positions[0], exit)
+				wait_count = self.wait_count
+				if isinstance(wait_count, dict):
+					wait_count = wait_count[self.pos_tf]
+
+				if self.post_entry_bar_count == wait_count:
+					# Spread costs are applied afterwards, see CostModel
+					exit_bar = self.bars[self.pos_tf][-1]
+					self.close_position(self.positions[0], exit_bar.close, exit_bar.spread)
 					self.pos_tf = None
 					self.post_entry_bar_count = 0
 
@@ -64,5 +64,28 @@ class BarStructureStrategy(ss.Strategy):
 				elif sell:
 					_type = "sell" if not self.reverse else "buy"
 
-				self.open_position(_type, self.bars[tf][-1].close, self.bars[tf][-1].close_time)
-				self.pos_tf = tf
\ No newline at end of file
+				self.open_position(_type, self.bars[tf][-1].close, self.bars[tf][-1].close_time, self.bars[tf][-1].spread)
+				self.pos_tf = tf
+
+"""
+Builds a strategy from a config dict as written by
+the exploration scripts, e.g.
+{'type': "buy", 'struct': "top_pin", 'wait_count': 2, 'timeframe': <tf>}
+Arguments of the struct other than the bars go in
+an optional 'struct_kwargs' dict, e.g. {'ratio': 2.5}.
+'wait_count' can also be <timeframe> : <count>.
+"""
+def from_config(config):
+	struct = getattr(structs, config['struct'])
+	if config.get('struct_kwargs'):
+		struct = functools.partial(struct, **config['struct_kwargs'])
+
+	tf_to_struct = {config['timeframe']: [None, None]}
+	tf_to_struct[config['timeframe']][0 if config['type'] == "buy" else 1] = struct
+
+	# JSON turns timeframe keys into strings
+	wait_count = config['wait_count']
+	if isinstance(wait_count, dict):
+		wait_count = {int(tf): count for tf, count in wait_count.items()}
+
+	return BarStructureStrategy(tf_to_struct, wait_count)
@@ -56,7 +56,7 @@ def engulfing_bear(bars):
 
 	return bull_bear and engulf
 
-def bottom_pin(bars):
+def bottom_pin(bars, ratio=3):
 	if len(bars) < 1:
 		return False
 
@@ -66,11 +66,11 @@ def bottom_pin(bars):
 
 	body += 0.00001 # in case body is 0.0, we add a point
 
-	pin = wick/body > 3
+	pin = wick/body > ratio
 	
 	return bear and pin
 
-def top_pin(bars):
+def top_pin(bars, ratio=3):
 	if len(bars) < 1:
 		return False
 
@@ -80,7 +80,7 @@ def top_pin(bars):
 
 	body += 0.00001 # in case body is 0.0, we add a point
 
-	pin = wick/body > 3
+	pin = wick/body > ratio
 	
 	return bull and pin
 
@@ -0,0 +1,144 @@
+"""
+Applies trading cost assumptions to the raw trades of
+a finished test, so a strategy can be checked against
+many spread, commission and slippage assumptions
+without rerunning the test for each one.
+
+Bar prices are bid prices. A buy fills at the ask on
+entry and a sell fills at the ask on exit, so each
+trade pays the spread of one of its fills.
+"""
+import numpy as np
+import StrategySuite as ss
+
+POINT = 0.00001 # what bar spreads are measured in
+PIP = 0.0001 # what Analyzer reports in
+
+"""
+One set of cost assumptions.
+spread_mult scales the recorded bar spreads,
+commission is in pips per trade and slippage
+is in pips per fill.
+"""
+class CostScenario:
+	def __init__(self, spread_mult=1.0, commission=0.0, slippage=0.0):
+		self.spread_mult = spread_mult
+		self.commission = commission
+		self.slippage = slippage
+
+	def as_dict(self):
+		return {'spread_mult': self.spread_mult,
+				'commission': self.commission,
+				'slippage': self.slippage}
+
+
+"""
+Returns the cost of every trade under every
+scenario in price units, as an array of shape
+(<scenario count>, <trade count>).
+"""
+def cost_matrix(trades, scenarios, point=POINT):
+	buys = np.array([trade.type == "buy" for trade in trades], dtype=bool)
+	entry_spreads = np.array([trade.entry_spread for trade in trades], dtype=float)
+	exit_spreads = np.array([trade.exit_spread for trade in trades], dtype=float)
+	spreads = np.where(buys, entry_spreads, exit_spreads) * point
+
+	spread_mults = np.array([scenario.spread_mult for scenario in scenarios], dtype=float)
+	fixed = np.array([scenario.commission + 2*scenario.slippage for scenario in scenarios], dtype=float) * PIP
+
+	return spread_mults[:, None] * spreads[None, :] + fixed[:, None]
+
+
+"""
+Returns a copy of the trade with the cost taken
+out of its exit price.
+"""
+def with_cost(trade, cost):
+	exit_price = trade.exit_price - cost if trade.type == "buy" else trade.exit_price + cost
+
+	return ss.Trade(trade.entry_time, trade.entry_price, exit_price, trade.type,
+					trade.entry_spread, trade.exit_spread)
+
+
+"""
+Costs every trade under all scenarios at once and
+returns an Analyzer for each scenario, in the same
+order, with the stats and balances Analyzer.analyze
+would give. They are computed with numpy over a
+(<scenario count>, <trade count>) profit matrix.
+Cost adjusted trades are only built when weekly
+stats are asked for.
+"""
+def analyze_scenarios(trades, scenarios, calc_weekly=False, point=POINT):
+	costs = cost_matrix(trades, scenarios, point)
+	raw_profits = np.array([trade.profit for trade in trades], dtype=float)
+	profits = (raw_profits[None, :] - costs) * 10000 # in pips, like Analyzer
+
+	wins = profits > 0
+	losses = profits < 0
+	# Cumulative sums add in trade order, like Analyzer does
+	balances = np.concatenate([np.zeros((len(scenarios), 1)), np.cumsum(profits, axis=1)], axis=1)
+	win_totals = np.cumsum(np.where(wins, profits, 0), axis=1)
+	loss_totals = np.cumsum(np.where(losses, profits, 0), axis=1)
+	win_counts = wins.sum(axis=1)
+	loss_counts = losses.sum(axis=1)
+
+	analyzers = []
+	for k in range(len(scenarios)):
+		analyzer = ss.Analyzer()
+		analyzer.balances = balances[k].tolist()
+		analyzer.stats = {'profit': 0,
+						'count': 0,
+						'break_even': 0,
+						'win_avg': 0,
+						'loss_avg': 0,
+						'acc': 0.5,
+						'max_consecutive_loss': 0,
+						'max_consecutive_win': 0}
+
+		# There may be no trades
+		if trades:
+			win, loss = int(win_counts[k]), int(loss_counts[k])
+			max_con_win, max_con_loss = consecutive_extremes(profits[k])
+			analyzer.stats['profit'] = round(float(balances[k, -1]), 3)
+			analyzer.stats['count'] = len(trades)
+			analyzer.stats['break_even'] = len(trades) - win - loss
+			if win+loss != 0:
+				analyzer.stats['acc'] = round(win / (win+loss), 3)
+			if loss != 0:
+				analyzer.stats['loss_avg'] = round(float(loss_totals[k, -1]) / loss, 3)
+			if win != 0:
+				analyzer.stats['win_avg'] = round(float(win_totals[k, -1]) / win, 3)
+			analyzer.stats['max_consecutive_win'] = round(max_con_win, 3)
+			analyzer.stats['max_consecutive_loss'] = round(max_con_loss, 3)
+
+		if calc_weekly:
+			analyzer.trades = [with_cost(trade, cost) for trade, cost in zip(trades, costs[k].tolist())]
+			analyzer.weekly = analyzer.weekly_mean_dev_min_max(analyzer.weekly_stats(analyzer.trades))
+
+		analyzers.append(analyzer)
+
+	return analyzers
+
+"""
+Returns the largest sum of a winning streak and the
+lowest sum of a losing streak, the way Analyzer
+counts them: break even trades don't end a streak,
+and the streak still going at the end isn't counted.
+"""
+def consecutive_extremes(profits):
+	profits = profits[profits != 0]
+	if len(profits) == 0:
+		return 0, 0
+
+	winning = profits > 0
+	starts = np.concatenate([[0], np.flatnonzero(winning[1:] != winning[:-1]) + 1])
+	# Drop the streak still going at the end
+	streaks = np.add.reduceat(profits, starts)[:-1]
+
+	win_streaks = streaks[streaks > 0]
+	loss_streaks = streaks[streaks < 0]
+	max_con_win = float(win_streaks.max()) if len(win_streaks) else 0
+	max_con_loss = float(loss_streaks.min()) if len(loss_streaks) else 0
+
+	return max_con_win, max_con_loss
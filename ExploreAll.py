@@ -2,89 +2,89 @@
 # https://www.mql5.com
 
 from datetime import datetime
-import MetaTrader5 as mt5
+import Timeframes
 import BarStructureStrategy as bss
+import StrategySuite as ss
 import pytz
-import utils
+import Reporting
 import BarStructures as structs
-import matplotlib.pyplot as plt
-import pandas as pd
-
-if not mt5.initialize():
-	print("Failed to initialize!")
-	quit()
-
-if not mt5.login(44226735): # Demo Account with 10k balance
-	print("Failed to login to Demo Account!")
-	quit()
-
-# utils.display_account_info()
-
-tfs = [mt5.TIMEFRAME_D1,
-		mt5.TIMEFRAME_H8,
-		#mt5.TIMEFRAME_H4,
-		#mt5.TIMEFRAME_H1,
-		#mt5.TIMEFRAME_M30,
-		#mt5.TIMEFRAME_M15,
-		#mt5.TIMEFRAME_M5,
-		#mt5.TIMEFRAME_M1,
-		]
-
-all_results = []
-counter = 0
-buy_sell_range = range(2)
-wait_range = range(2,4)
-# 0 for buy, 1 for sell
-for i in buy_sell_range:
-	for struct in structs.funcs_list:
-		for tf in tfs:
-			for wait_count in wait_range:
-				print("Progress:", counter / 
-					(len(buy_sell_range)*len(structs.funcs_list)*len(tfs)*len(wait_range)))
-				counter += 1
-
-				tf_to_struct = {tf: [None, None]}
-				tf_to_struct[tf][i] = struct
-
-				strat = bss.BarStructureStrategy(tf_to_struct,
-												wait_count)
-
-				timezone = pytz.timezone("Etc/UTC") # Forex.com servers are on GMT+3
-				t_from = datetime(2001, 1, 1, tzinfo=timezone)
-				t_to = datetime(2021, 1, 1, tzinfo=timezone)
-
-				# print("Beginning test:")
-				# print("Start date:", t_from)
-				# print("End date:", t_to)
-				# print("Wait count:", wait_count)
-				# begin_time = datetime.now()
-				strat.test("EURUSD", t_from, t_to, calc_weekly=True, display=False)
-				# print("\nTest completed.")
-				# end_time = round((datetime.now() - begin_time).total_seconds(), 2)
-				# print("Time elapsed:", end_time, "seconds\n\n")
-
-				config = {}
-				config['type'] = "buy" if i == 0 else "sell"
-				config['struct'] = struct.__name__
-				config['wait_count'] = wait_count
-				config['timeframe'] = tf
-
-				all_results.append({"config": config,
-									"general_stats": strat.analyzer.stats,
-									"weekly_stats": strat.analyzer.weekly})
 
+# Strategies tested together, bounding how many are kept in memory at once
+CHUNK_SIZE = 50
+
+if __name__ == "__main__":
+	import MetaTrader5 as mt5
+
+	if not mt5.initialize():
+		print("Failed to initialize!")
+		quit()
+
+	if not mt5.login(44226735): # Demo Account with 10k balance
+		print("Failed to login to Demo Account!")
+		quit()
+
+	# utils.display_account_info()
+
+	tfs = [Timeframes.TIMEFRAME_D1,
+			Timeframes.TIMEFRAME_H8,
+			#Timeframes.TIMEFRAME_H4,
+			#Timeframes.TIMEFRAME_H1,
+			#Timeframes.TIMEFRAME_M30,
+			#Timeframes.TIMEFRAME_M15,
+			#Timeframes.TIMEFRAME_M5,
+			#Timeframes.TIMEFRAME_M1,
+			]
+
+	timezone = pytz.timezone("Etc/UTC") # Forex.com servers are on GMT+3
+	t_from = datetime(2001, 1, 1, tzinfo=timezone)
+	t_to = datetime(2021, 1, 1, tzinfo=timezone)
+
+	configs = []
+	# 0 for buy, 1 for sell
+	for i in range(2):
+		for struct in structs.funcs_list:
+			for tf in tfs:
+				for wait_count in range(2,4):
+					config = {}
+					config['type'] = "buy" if i == 0 else "sell"
+					config['struct'] = struct.__name__
+					config['wait_count'] = wait_count
+					config['timeframe'] = tf
+					configs.append(config)
+
+	# Strategies are tested in chunks sharing one pass over the bars.
+	# Each chunk's results go to disk and its strategies, with their
+	# bars and trades, are dropped before the next one is built, so
+	# memory doesn't grow with the size of the sweep.
+	print("Testing", len(configs), "strategies in chunks of", CHUNK_SIZE)
+	begin_time = datetime.now()
+	with Reporting.ResultWriter("test_results", mode="w") as writer:
+		for first in range(0, len(configs), CHUNK_SIZE):
+			chunk = configs[first:first + CHUNK_SIZE]
+			strats = [bss.from_config(config) for config in chunk]
+			ss.test_all(strats, "EURUSD", t_from, t_to, calc_weekly=True, display=False)
+
+			for config, strat in zip(chunk, strats):
+				writer.append({"config": config,
+								"general_stats": strat.analyzer.stats,
+								"weekly_stats": strat.analyzer.weekly},
+								strat.analyzer.balances)
+
+				# import matplotlib.pyplot as plt
 				# plt.plot(strat.analyzer.balances)
 				# plt.show()
 
-df = pd.DataFrame(utils.all_results_to_df_dict(all_results))
-df_html = df.to_html()
+			writer.flush()
+			del strats
+			print("Tested", first + len(chunk), "/", len(configs))
 
-# write html to file
-file = open("test_results.html", "w")
-file.write(df_html)
-file.close()
+	end_time = round((datetime.now() - begin_time).total_seconds(), 2)
+	print("Time elapsed:", end_time, "seconds\n\n")
 
+	Reporting.write_report("test_results", "test_results_report")
+	print("Report written to test_results_report/index.html")
 
-print("Shutting down connection.")
-mt5.shutdown()
-print("Script ended.")
\ No newline at end of file
+
+	print("Shutting down connection.")
+	mt5.shutdown()
+	print("Script ended.")
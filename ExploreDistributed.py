@@ -0,0 +1,141 @@
+# Ahmet Oguzlu
+# https://www.mql5.com
+
+"""
+Distributed version of ExploreAll.py. The sweep is
+written into a WorkQueue that any number of workers,
+on any number of hosts, pull from.
+
+python ExploreDistributed.py coordinator sweep.db
+python ExploreDistributed.py worker sweep.db -n 4
+python ExploreDistributed.py worker sweep.db -n 4 --store bars/
+python ExploreDistributed.py collect sweep.db --out test_results_report
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+from datetime import datetime
+import pytz
+import Reporting
+import Timeframes
+import BarStructureStrategy as bss
+import BarStructures as structs
+import WorkQueue as wq
+
+
+def sweep_jobs():
+	tfs = [Timeframes.TIMEFRAME_D1,
+			Timeframes.TIMEFRAME_H8,
+			#Timeframes.TIMEFRAME_H4,
+			#Timeframes.TIMEFRAME_H1,
+			#Timeframes.TIMEFRAME_M30,
+			#Timeframes.TIMEFRAME_M15,
+			#Timeframes.TIMEFRAME_M5,
+			#Timeframes.TIMEFRAME_M1,
+			]
+
+	# Dates go through JSON, so they are stored as strings
+	test = {'symbol': "EURUSD",
+			'start': "2001-01-01",
+			'end': "2021-01-01"}
+
+	jobs = []
+	# 0 for buy, 1 for sell
+	for i in range(2):
+		for struct in structs.funcs_list:
+			for tf in tfs:
+				for wait_count in range(2,4):
+					config = {}
+					config['type'] = "buy" if i == 0 else "sell"
+					config['struct'] = struct.__name__
+					config['wait_count'] = wait_count
+					config['timeframe'] = tf
+
+					jobs.append({"config": config, "test": test})
+
+	return jobs
+
+
+def run_job(job, store=None):
+	timezone = pytz.timezone("Etc/UTC") # Forex.com servers are on GMT+3
+	t_from = timezone.localize(datetime.fromisoformat(job['test']['start']))
+	t_to = timezone.localize(datetime.fromisoformat(job['test']['end']))
+
+	strat = bss.from_config(job['config'])
+	strat.test(job['test']['symbol'], t_from, t_to, calc_weekly=True, display=False, store=store)
+
+	return {"general_stats": strat.analyzer.stats,
+			"weekly_stats": strat.analyzer.weekly,
+			"equity": Reporting.downsample(strat.analyzer.balances)}
+
+
+"""
+Runs jobs until the queue is finished. Bars come
+from the BarStore at store_root if given, which
+doesn't need the MT5 terminal.
+"""
+def worker(path, lease, store_root=None):
+	if store_root is not None:
+		import BarStore
+
+		job_func = functools.partial(run_job, store=BarStore.BarStore(store_root))
+		done = wq.run_worker(path, job_func, lease=lease)
+		print(wq.default_worker_id(), "completed", done, "jobs.")
+		return
+
+	import MetaTrader5 as mt5
+
+	if not mt5.initialize():
+		print("Failed to initialize!")
+		return
+
+	done = wq.run_worker(path, run_job, lease=lease)
+	print(wq.default_worker_id(), "completed", done, "jobs.")
+
+	mt5.shutdown()
+
+
+def collect(path, out):
+	queue = wq.WorkQueue(path)
+	print("Job counts:", queue.counts())
+	for job, error in queue.failures():
+		print("\nFailed job:", job['config'])
+		print(error)
+
+	results_path = out + "_data"
+	with Reporting.ResultWriter(results_path, mode="w") as writer:
+		for job, result in queue.results():
+			equity = result.pop("equity")
+			writer.append({"config": job['config'], **result}, equity)
+	counts = queue.counts()
+	queue.close()
+
+	Reporting.write_report(results_path, out, counts=counts)
+	print("Report written to", os.path.join(out, "index.html"))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Distributed strategy sweep.")
+	parser.add_argument("mode", choices=["coordinator", "worker", "collect"])
+	parser.add_argument("queue", help="path of the shared SQLite queue")
+	parser.add_argument("-n", type=int, default=1, help="number of local workers to start")
+	parser.add_argument("--lease", type=float, default=600, help="lease length of a job in seconds")
+	parser.add_argument("--store", help="root of a BarStore to read bars from instead of MT5")
+	parser.add_argument("--out", default="test_results_report", help="directory to write the report to")
+	args = parser.parse_args()
+
+	if args.mode == "coordinator":
+		queue = wq.WorkQueue(args.queue)
+		print("Queued", queue.add_jobs(sweep_jobs()), "jobs.")
+		queue.close()
+
+	elif args.mode == "worker":
+		procs = [multiprocessing.Process(target=worker, args=(args.queue, args.lease, args.store)) for _ in range(args.n)]
+		for proc in procs:
+			proc.start()
+		for proc in procs:
+			proc.join()
+
+	else:
+		collect(args.queue, args.out)
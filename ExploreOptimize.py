@@ -0,0 +1,157 @@
+# Ahmet Oguzlu
+# https://www.mql5.com
+
+"""
+Searches BarStructureStrategy parameters with the
+Optimizer instead of a full grid, maximizing profit
+while minimizing drawdown.
+
+python ExploreOptimize.py
+python ExploreOptimize.py --store bars/ --compare
+
+--compare also tests a full grid of the space and
+tells where the optimizer's best config ranks in it.
+"""
+import argparse
+import itertools
+from datetime import datetime
+import Timeframes
+import Optimizer as opt
+import pytz
+
+space = {'type': opt.Choice(["buy", "sell"]),
+		'struct': opt.Choice(["consec_bull", "consec_bear", "top_pin", "bottom_pin",
+							"breaking_high_pull", "breaking_low_pull"]),
+		'timeframe': opt.Choice([Timeframes.TIMEFRAME_D1,
+								Timeframes.TIMEFRAME_H8,
+								Timeframes.TIMEFRAME_H4,
+								Timeframes.TIMEFRAME_H1]),
+		'wait_count': opt.Int(1, 12),
+		'consec_count': opt.Int(1, 8),
+		'pin_ratio': opt.Float(1.5, 6),
+		'pull_count': opt.Int(0, 3)}
+
+"""
+Turns params into a BarStructureStrategy config,
+passing each struct only the arguments it takes.
+"""
+def to_config(params):
+	struct_kwargs = {}
+	if params['struct'].startswith("consec"):
+		struct_kwargs['count'] = params['consec_count']
+	elif params['struct'].endswith("pin"):
+		struct_kwargs['ratio'] = params['pin_ratio']
+	else:
+		struct_kwargs['pull_count'] = params['pull_count']
+
+	return {'type': params['type'],
+			'struct': params['struct'],
+			'struct_kwargs': struct_kwargs,
+			'wait_count': params['wait_count'],
+			'timeframe': params['timeframe']}
+
+"""
+Pins the params the struct ignores, so configs
+that only differ in them aren't tested twice.
+"""
+def normalize(params):
+	params = dict(params)
+	if not params['struct'].startswith("consec"):
+		params['consec_count'] = 1
+	if not params['struct'].endswith("pin"):
+		params['pin_ratio'] = 3
+	if not params['struct'].endswith("pull"):
+		params['pull_count'] = 0
+	return params
+
+"""
+Too few trades to trust the stats.
+"""
+def enough_trades(params, metrics):
+	return metrics['count'] >= 50
+
+"""
+Yields the distinct normalized params of a grid
+over the space, with pin_ratio at the given values.
+"""
+def grid(tfs, pin_ratios=(1.5, 2, 3, 4.5, 6)):
+	axes = dict(space)
+	axes['timeframe'] = opt.Choice(tfs)
+	values = {name: param.options if isinstance(param, opt.Choice) else list(range(param.low, param.high + 1))
+				for name, param in axes.items() if name != 'pin_ratio'}
+	values['pin_ratio'] = list(pin_ratios)
+
+	seen = set()
+	for combo in itertools.product(*values.values()):
+		params = normalize(dict(zip(values, combo)))
+		key = opt.params_key(params)
+		if key not in seen:
+			seen.add(key)
+			yield params
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Optimize BarStructureStrategy parameters.")
+	parser.add_argument("--store", help="root of a BarStore to read bars from instead of MT5")
+	parser.add_argument("--start", default="2001-01-01")
+	parser.add_argument("--end", default="2021-01-01")
+	parser.add_argument("--processes", type=int, default=4)
+	parser.add_argument("--population", type=int, default=32)
+	parser.add_argument("--generations", type=int, default=10)
+	parser.add_argument("--seed", type=int)
+	parser.add_argument("--compare", action="store_true", help="also test the full grid and compare")
+	args = parser.parse_args()
+
+	timezone = pytz.timezone("Etc/UTC") # Forex.com servers are on GMT+3
+	t_from = timezone.localize(datetime.fromisoformat(args.start))
+	t_to = timezone.localize(datetime.fromisoformat(args.end))
+
+	store = None
+	if args.store is not None:
+		import BarStore
+
+		store = BarStore.BarStore(args.store)
+		# Only search the timeframes the store has
+		space['timeframe'] = opt.Choice([tf for tf in space['timeframe'].options if store.has("EURUSD", tf)])
+	else:
+		import MetaTrader5 as mt5
+
+		if not mt5.initialize():
+			print("Failed to initialize!")
+			quit()
+
+	with opt.BarStructureEvaluator(to_config, "EURUSD", t_from, t_to,
+									store=store, processes=args.processes) as evaluate:
+		optimizer = opt.Optimizer(space, evaluate,
+								objectives={'profit': "max", 'max_drawdown': "min"},
+								normalize=normalize,
+								constraints=[enough_trades],
+								population=args.population,
+								seed=args.seed)
+		front = optimizer.run(generations=args.generations)
+
+		if not front:
+			print("\nTested", len(optimizer.history), "configs. None of them met the constraints.")
+			if args.compare:
+				print("Nothing to compare with the grid.")
+		else:
+			print("\nTested", len(optimizer.history), "configs. Pareto front:")
+			for cand in sorted(front, key=lambda cand: -cand.metrics['profit']):
+				print(to_config(cand.params), "Profit:", cand.metrics['profit'], "Max drawdown:", cand.metrics['max_drawdown'])
+
+		if args.compare and front:
+			params_list = list(grid(space['timeframe'].options))
+			profits = [metrics['profit'] for params, metrics in zip(params_list, evaluate(params_list))
+						if enough_trades(params, metrics)]
+			best = max(cand.metrics['profit'] for cand in front)
+			if not profits:
+				print("\nGrid: tested", len(params_list), "configs. None of them met the constraints.")
+			else:
+				print("\nGrid: tested", len(params_list), "configs, best profit:", max(profits))
+			print("Optimizer: tested", len(optimizer.history), "configs, best profit:", best,
+					"which", sum(1 for profit in profits if profit > best), "grid configs beat")
+
+	if store is None:
+		print("Shutting down connection.")
+		mt5.shutdown()
+	print("Script ended.")
@@ -0,0 +1,64 @@
+"""
+Checks that the engine modules import fast and without
+the optional integrations. Each module is imported in a
+fresh interpreter, the way a pool or distributed worker
+starts. Exits with status 1 if a module is over budget
+or pulls in an optional integration.
+
+python ImportBudget.py
+"""
+import os
+import subprocess
+import sys
+
+# Milliseconds allowed for importing each module, on top of interpreter startup
+BUDGET_MS = 50
+
+ENGINE_MODULES = ["Timeframes",
+				"StrategySuite",
+				"BarStructures",
+				"BarStructureStrategy",
+				# Imported first thing by every queue and optimizer worker
+				"WorkQueue",
+				"Optimizer"]
+
+OPTIONAL = ["MetaTrader5", "pandas", "matplotlib", "numpy"]
+
+MEASURE = """
+import sys, time
+begin = time.perf_counter()
+import %s
+elapsed = (time.perf_counter() - begin) * 1000
+print(elapsed)
+print(",".join(name for name in %r if name in sys.modules))
+"""
+
+"""
+Imports the module in a fresh interpreter. Returns the
+import time in milliseconds and the optional
+integrations that got imported along with it.
+"""
+def measure(module):
+	out = subprocess.run([sys.executable, "-c", MEASURE % (module, OPTIONAL)],
+						capture_output=True, text=True, check=True,
+						cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split("\n")
+
+	return float(out[0]), [name for name in out[1].split(",") if name]
+
+
+if __name__ == "__main__":
+	ok = True
+	for module in ENGINE_MODULES:
+		elapsed, imported = measure(module)
+		print(module, ":", round(elapsed, 2), "ms")
+
+		if elapsed > BUDGET_MS:
+			print("\tOver the budget of", BUDGET_MS, "ms!")
+			ok = False
+		if imported:
+			print("\tImports optional integrations:", imported)
+			ok = False
+
+	if not ok:
+		sys.exit(1)
+	print("All engine modules are within budget.")
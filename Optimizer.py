@@ -0,0 +1,405 @@
+"""
+Evolutionary search over strategy parameters.
+Instead of testing every point of a grid, each
+generation proposes a batch of configurations bred
+from the best ones so far and evaluates the batch
+at once. Several objectives (e.g. profit and
+drawdown) are optimized together in the NSGA-II
+way, and the result is their Pareto front.
+"""
+import multiprocessing
+import random
+
+"""
+Parameter taking whole numbers in [low, high].
+"""
+class Int:
+	def __init__(self, low, high):
+		self.low = low
+		self.high = high
+
+	def sample(self, rng):
+		return rng.randint(self.low, self.high)
+
+	def mutate(self, value, rng):
+		step = max(1, abs(round(rng.gauss(0, (self.high - self.low) / 6))))
+		value += step if rng.random() < 0.5 else -step
+		return min(self.high, max(self.low, value))
+
+"""
+Parameter taking real numbers in [low, high],
+rounded to the given number of digits.
+"""
+class Float:
+	def __init__(self, low, high, digits=2):
+		self.low = low
+		self.high = high
+		self.digits = digits
+
+	def sample(self, rng):
+		return round(rng.uniform(self.low, self.high), self.digits)
+
+	def mutate(self, value, rng):
+		value += rng.gauss(0, (self.high - self.low) / 6)
+		return round(min(self.high, max(self.low, value)), self.digits)
+
+"""
+Parameter taking one of the given options.
+"""
+class Choice:
+	def __init__(self, options):
+		self.options = list(options)
+
+	def sample(self, rng):
+		return rng.choice(self.options)
+
+	def mutate(self, value, rng):
+		others = [option for option in self.options if option != value]
+		return rng.choice(others) if others else value
+
+
+"""
+An evaluated set of parameters.
+"""
+class Candidate:
+	def __init__(self, params, metrics, violations):
+		self.params = params
+		self.metrics = metrics
+		# Number of constraints the metrics break
+		self.violations = violations
+		self.rank = None
+		self.crowding = 0
+
+
+class Optimizer:
+	"""
+	space: {<name> : <Int/Float/Choice>}
+	evaluate: takes a list of params dicts and returns
+		a metrics dict for each, in the same order.
+	objectives: {<metric> : "max" or "min"}
+	normalize: optional callable mapping proposed params
+		to the params to evaluate, e.g. to pin parameters
+		a config ignores so it isn't evaluated twice.
+	valid: optional callables taking params. Params that
+		fail any of them are never evaluated.
+	constraints: optional callables taking params and
+		metrics. Candidates that fail them lose to every
+		candidate that doesn't.
+	"""
+	def __init__(self, space, evaluate, objectives, normalize=None, valid=(), constraints=(),
+				population=24, seed=None):
+		self.space = space
+		self.evaluate = evaluate
+		self.objectives = objectives
+		self.normalize = normalize
+		self.valid = list(valid)
+		self.constraints = list(constraints)
+		self.population_size = population
+		self.rng = random.Random(seed)
+
+		# Every candidate evaluated so far, in order
+		self.history = []
+		# <params key> : <Candidate>, so nothing is evaluated twice
+		self.seen = {}
+
+	"""
+	Runs the search and returns the Pareto front of
+	all the candidates evaluated. Evaluates at most
+	population * (generations + 1) configurations.
+	"""
+	def run(self, generations):
+		population = self.select(self.evaluate_batch(self.propose(self.random_params)))
+		if len(population) == 0:
+			raise ValueError("No valid params to start from, check the space and the valid filters")
+
+		for gen in range(generations):
+			print("Generation:", gen + 1, "/", generations, "Evaluated:", len(self.history))
+
+			offspring = self.evaluate_batch(self.propose(lambda: self.breed(population)))
+			population = self.select(population + offspring)
+
+		return self.pareto_front()
+
+	"""
+	Returns the feasible candidates that no other
+	feasible candidate beats on every objective.
+	"""
+	def pareto_front(self):
+		feasible = [cand for cand in self.history if cand.violations == 0]
+		return [cand for cand in feasible
+				if not any(self.dominates(other, cand) for other in feasible)]
+
+	"""
+	Returns a batch of new, valid params made by
+	make_params. Stops early if it can't find new
+	ones, which happens once a small space is used up.
+	"""
+	def propose(self, make_params):
+		batch = []
+		keys = set()
+		attempts = 0
+		while len(batch) < self.population_size and attempts < 100 * self.population_size:
+			attempts += 1
+			params = make_params()
+			if self.normalize is not None:
+				params = self.normalize(params)
+			key = params_key(params)
+			if key in self.seen or key in keys:
+				continue
+			if not all(valid(params) for valid in self.valid):
+				continue
+
+			batch.append(params)
+			keys.add(key)
+
+		return batch
+
+	def random_params(self):
+		return {name: param.sample(self.rng) for name, param in self.space.items()}
+
+	"""
+	Makes params from two parents picked by binary
+	tournament, with uniform crossover and mutation
+	of each parameter with probability 1/<number of
+	parameters>.
+	"""
+	def breed(self, population):
+		mom = self.tournament(population)
+		dad = self.tournament(population)
+		mutation_rate = 1 / len(self.space)
+
+		params = {}
+		for name, param in self.space.items():
+			value = mom.params[name] if self.rng.random() < 0.5 else dad.params[name]
+			if self.rng.random() < mutation_rate:
+				value = param.mutate(value, self.rng)
+			params[name] = value
+
+		return params
+
+	def tournament(self, population):
+		a, b = self.rng.choice(population), self.rng.choice(population)
+		return min(a, b, key=lambda cand: (cand.rank, -cand.crowding))
+
+	def evaluate_batch(self, batch):
+		if len(batch) == 0:
+			return []
+
+		candidates = []
+		for params, metrics in zip(batch, self.evaluate(batch)):
+			violations = sum(1 for constraint in self.constraints if not constraint(params, metrics))
+			cand = Candidate(params, metrics, violations)
+			self.seen[params_key(params)] = cand
+			self.history.append(cand)
+			candidates.append(cand)
+
+		return candidates
+
+	"""
+	Returns True if a is better than b: it breaks fewer
+	constraints, or it is no worse on any objective and
+	better on at least one.
+	"""
+	def dominates(self, a, b):
+		if a.violations != b.violations:
+			return a.violations < b.violations
+
+		better = False
+		for metric, direction in self.objectives.items():
+			a_val, b_val = a.metrics[metric], b.metrics[metric]
+			if direction == "min":
+				a_val, b_val = -a_val, -b_val
+			if a_val < b_val:
+				return False
+			if a_val > b_val:
+				better = True
+
+		return better
+
+	"""
+	Ranks the candidates into fronts and keeps the
+	best population_size of them, preferring lower
+	fronts and then less crowded candidates.
+	"""
+	def select(self, candidates):
+		survivors = []
+		for rank, front in enumerate(self.fronts(candidates)):
+			for cand in front:
+				cand.rank = rank
+			self.set_crowding(front)
+
+			if len(survivors) + len(front) > self.population_size:
+				front.sort(key=lambda cand: -cand.crowding)
+				survivors += front[:self.population_size - len(survivors)]
+				break
+			survivors += front
+
+		return survivors
+
+	def fronts(self, candidates):
+		# <index> : [<indices of the candidates it dominates>]
+		dominated = [[] for cand in candidates]
+		# Number of candidates dominating each candidate
+		dominators = [0 for cand in candidates]
+		for i, a in enumerate(candidates):
+			for j, b in enumerate(candidates):
+				if i != j and self.dominates(a, b):
+					dominated[i].append(j)
+					dominators[j] += 1
+
+		fronts = []
+		front = [i for i in range(len(candidates)) if dominators[i] == 0]
+		while front:
+			fronts.append([candidates[i] for i in front])
+			next_front = []
+			for i in front:
+				for j in dominated[i]:
+					dominators[j] -= 1
+					if dominators[j] == 0:
+						next_front.append(j)
+			front = next_front
+
+		return fronts
+
+	"""
+	Sets how far each candidate is from its neighbours
+	on the front, summed over objectives. Candidates at
+	the ends of the front are kept no matter what.
+	"""
+	def set_crowding(self, front):
+		for cand in front:
+			cand.crowding = 0
+
+		for metric in self.objectives:
+			front.sort(key=lambda cand: cand.metrics[metric])
+			front[0].crowding = front[-1].crowding = float("inf")
+			spread = front[-1].metrics[metric] - front[0].metrics[metric]
+			if spread == 0:
+				continue
+			for i in range(1, len(front) - 1):
+				front[i].crowding += (front[i+1].metrics[metric] - front[i-1].metrics[metric]) / spread
+
+
+def params_key(params):
+	return tuple(sorted(params.items(), key=lambda item: item[0]))
+
+"""
+Largest drop of the balance curve from its
+running peak, in pips.
+"""
+def max_drawdown(balances):
+	peak = balances[0]
+	drawdown = 0
+	for balance in balances:
+		peak = max(peak, balance)
+		drawdown = max(drawdown, peak - balance)
+
+	return round(drawdown, 3)
+
+
+"""
+Evaluates BarStructureStrategy configs. Each
+batch is split into one chunk per process and
+every chunk is tested over a single shared feed.
+to_config turns params into a config for
+BarStructureStrategy.from_config. Metrics are
+the Analyzer's general stats plus max_drawdown.
+
+Without a store, bars are downloaded from the
+terminal once, the first time a timeframe is
+needed, into a temporary BarStore that every
+process reads from; only this process talks to
+the terminal. The process pool is kept for the
+whole search. Call close() when done, or use
+the evaluator as a context manager.
+"""
+class BarStructureEvaluator:
+	def __init__(self, to_config, symbol, start_date, end_date, store=None, processes=1):
+		self.to_config = to_config
+		self.symbol = symbol
+		self.start = start_date
+		self.end = end_date
+		self.store = store
+		self.processes = processes
+
+		self.tmp_dir = None
+		self.pool = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __call__(self, batch):
+		configs = [self.to_config(params) for params in batch]
+		store = self.bar_store(configs)
+		if self.processes == 1:
+			return evaluate_configs(configs, self.symbol, self.start, self.end, store)
+
+		if self.pool is None:
+			self.pool = multiprocessing.Pool(self.processes)
+
+		chunk_size = -(-len(configs) // self.processes)
+		chunks = [(configs[i:i+chunk_size], self.symbol, self.start, self.end, store)
+					for i in range(0, len(configs), chunk_size)]
+		results = self.pool.starmap(evaluate_configs, chunks)
+
+		return [metrics for chunk in results for metrics in chunk]
+
+	"""
+	Returns the BarStore to test the configs on,
+	downloading the timeframes it doesn't have yet
+	if bars come from the terminal.
+	"""
+	def bar_store(self, configs):
+		if self.store is not None:
+			return self.store
+
+		import tempfile
+		import BarStore
+		import BarStructureStrategy as bss
+		import utils
+
+		if self.tmp_dir is None:
+			self.tmp_dir = tempfile.mkdtemp(prefix="bars_")
+		store = BarStore.BarStore(self.tmp_dir)
+
+		tfs = {tf for config in configs for tf in bss.from_config(config).tfs}
+		missing = [tf for tf in tfs if not store.has(self.symbol, tf)]
+		if missing:
+			utils.download_to_store(store, self.symbol, missing, self.start, self.end)
+
+		return store
+
+	def close(self):
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+
+		if self.tmp_dir is not None:
+			import shutil
+
+			shutil.rmtree(self.tmp_dir)
+			self.tmp_dir = None
+
+"""
+Tests configs together and returns the metrics
+of each, in the same order.
+"""
+def evaluate_configs(configs, symbol, start_date, end_date, store):
+	import BarStructureStrategy as bss
+	import StrategySuite as ss
+
+	strats = [bss.from_config(config) for config in configs]
+	ss.test_all(strats, symbol, start_date, end_date,
+				calc_weekly=False, display=False, store=store)
+
+	results = []
+	for strat in strats:
+		metrics = dict(strat.analyzer.stats)
+		metrics['max_drawdown'] = max_drawdown(strat.analyzer.balances)
+		results.append(metrics)
+
+	return results
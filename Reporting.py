@@ -0,0 +1,357 @@
+"""
+Streaming reports for large sweeps. Results are
+appended to a column store on disk as they arrive,
+instead of being kept in memory, and the report is
+built from it in a few passes over single columns:
+a summary page (top configs, metric distributions,
+per-timeframe breakdown, equity sparklines) plus
+detail pages holding every row, which are only
+loaded when opened.
+
+Column store layout, one JSON value per line:
+<path>/columns.json
+<path>/c<N>.col, for the Nth column in columns.json
+"""
+import heapq
+import html
+import json
+import os
+import Timeframes
+import utils
+
+META = "columns.json"
+EQUITY = "equity" # column of downsampled balance curves
+
+"""
+Returns at most points values of balances,
+evenly spaced and always keeping the last one.
+"""
+def downsample(balances, points=40):
+	if len(balances) <= points:
+		return [round(balance, 3) for balance in balances]
+
+	step = (len(balances) - 1) / (points - 1)
+	return [round(balances[round(i*step)], 3) for i in range(points)]
+
+
+"""
+Appends results to a column store. Rows are only
+visible to readers once flushed; close() flushes.
+mode "w" starts a new store, dropping any rows
+already at path. Mode "a" appends to them, after
+dropping rows that were never flushed.
+"""
+class ResultWriter:
+	def __init__(self, path, mode="a"):
+		if mode not in ("w", "a"):
+			raise ValueError("mode must be 'w' or 'a', not %r" % mode)
+
+		self.path = path
+		os.makedirs(path, exist_ok=True)
+
+		self.columns = []
+		self.rows = 0
+		if mode == "a" and os.path.exists(os.path.join(path, META)):
+			meta = read_meta(path)
+			self.columns, self.rows = meta['columns'], meta['rows']
+
+			# Drop rows written after the last flush
+			for index in range(len(self.columns)):
+				with open(column_path(path, index), "r+b") as file:
+					for i in range(self.rows):
+						file.readline()
+					file.truncate()
+
+		# Drop columns added after the last flush, or all of them
+		kept = {os.path.basename(column_path(path, index)) for index in range(len(self.columns))}
+		for name in os.listdir(path):
+			if (name.endswith(".col") and name not in kept) or name == META + ".tmp" or (mode == "w" and name == META):
+				os.remove(os.path.join(path, name))
+
+		# <column> : <open file>
+		self.files = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	"""
+	Appends a result ({"config": {...}, "general_stats":
+	{...}, ...}) as one row. If balances are given, a
+	downsampled copy is kept for sparklines.
+	"""
+	def append(self, result, balances=None):
+		row = utils.flatten_result(result)
+		if balances is not None:
+			row[EQUITY] = downsample(balances)
+
+		for name in row:
+			if name not in self.columns:
+				self.add_column(name)
+
+		for name in self.columns:
+			self.file(name).write(json.dumps(row.get(name), default=utils.to_builtin) + "\n")
+		self.rows += 1
+
+	def add_column(self, name):
+		self.columns.append(name)
+		# Earlier rows don't have it
+		self.file(name).write("null\n" * self.rows)
+
+	def file(self, name):
+		if name not in self.files:
+			self.files[name] = open(column_path(self.path, self.columns.index(name)), "a")
+		return self.files[name]
+
+	def flush(self):
+		for file in self.files.values():
+			file.flush()
+
+		tmp_path = os.path.join(self.path, META + ".tmp")
+		with open(tmp_path, "w") as file:
+			json.dump({'columns': self.columns, 'rows': self.rows}, file)
+		os.replace(tmp_path, os.path.join(self.path, META))
+
+	def close(self):
+		self.flush()
+		for file in self.files.values():
+			file.close()
+		self.files = {}
+
+
+"""
+Reads a column store one column at a time.
+"""
+class ResultReader:
+	def __init__(self, path):
+		self.path = path
+		meta = read_meta(path)
+		self.columns, self.rows = meta['columns'], meta['rows']
+
+	"""
+	Yields the values of a column in row order.
+	"""
+	def column(self, name):
+		with open(column_path(self.path, self.columns.index(name))) as file:
+			for i, line in enumerate(file):
+				if i == self.rows:
+					break
+				yield json.loads(line)
+
+	"""
+	Yields rows as dicts of the given columns.
+	"""
+	def iter_rows(self, names=None):
+		names = self.columns if names is None else names
+		for values in zip(*[self.column(name) for name in names]):
+			yield dict(zip(names, values))
+
+
+def read_meta(path):
+	with open(os.path.join(path, META)) as file:
+		return json.load(file)
+
+def column_path(path, index):
+	# Files are named by position. Column names come from result keys,
+	# which needn't be file name safe, and making them so can clash.
+	return os.path.join(path, "c%d.col" % index)
+
+def is_number(value):
+	return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+"""
+Builds an HTML report of the column store at path
+into out_dir. Memory use is bounded by top_n and
+page_size, not by the number of results. counts
+({<status> : <job count>}, e.g. WorkQueue.counts())
+are shown on the summary page if given.
+"""
+def write_report(path, out_dir, sort_by="profit", top_n=50, group_by="timeframe", page_size=500, bins=20,
+				counts=None):
+	reader = ResultReader(path)
+	os.makedirs(os.path.join(out_dir, "details"), exist_ok=True)
+	table_columns = [name for name in reader.columns if name != EQUITY]
+	names = reader.columns
+
+	pages = write_detail_pages(reader, out_dir, table_columns, page_size)
+
+	# Top configs, keeping only top_n (value, row) pairs around
+	top = []
+	if sort_by in names:
+		ranked = ((value, i) for i, value in enumerate(reader.column(sort_by)) if is_number(value))
+		top = heapq.nlargest(top_n, ranked)
+	top_rows = {i: None for value, i in top}
+	if top_rows:
+		for i, row in enumerate(reader.iter_rows(names)):
+			if i in top_rows:
+				top_rows[i] = row
+
+	file = open(os.path.join(out_dir, "index.html"), "w")
+	file.write("<html><head><meta charset='utf-8'><title>Test results</title>" + STYLE + "</head><body>\n")
+	file.write("<h1>Test results</h1>\n<p>%d configs tested.</p>\n" % reader.rows)
+	if counts is not None:
+		file.write("<p>Jobs: %s</p>\n" % ", ".join("%d %s" % (count, html.escape(status))
+													for status, count in counts.items()))
+
+	file.write("<h2>Top %d by %s</h2>\n" % (len(top), html.escape(sort_by)))
+	if top:
+		file.write(table_header(table_columns + ([EQUITY] if EQUITY in names else [])))
+		for value, i in top:
+			row = top_rows[i]
+			cells = [format_value(name, row[name]) for name in table_columns]
+			if EQUITY in names:
+				cells.append(sparkline(row[EQUITY]))
+			file.write("<tr>" + "".join("<td>%s</td>" % cell for cell in cells) + "</tr>\n")
+		file.write("</table>\n")
+	else:
+		file.write("<p>No results with a %s to rank.</p>\n" % html.escape(sort_by))
+
+	if group_by in names and sort_by in names and is_number_column(reader, sort_by):
+		file.write("<h2>%s by %s</h2>\n" % (html.escape(sort_by), html.escape(group_by)))
+		file.write(group_table(reader, group_by, sort_by))
+
+	file.write("<h2>Distributions</h2>\n<table>\n<tr><th>metric</th><th>min</th><th>mean</th><th>max</th><th>histogram</th></tr>\n")
+	for name in table_columns:
+		stats = column_stats(reader, name)
+		if stats is None:
+			continue
+		low, mean, high = stats
+		file.write("<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>\n"
+					% (html.escape(name), round(low, 3), round(mean, 3), round(high, 3),
+						histogram(histogram_counts(reader, name, low, high, bins))))
+	file.write("</table>\n")
+
+	file.write("<h2>All results</h2>\n<p>")
+	for page, first, last in pages:
+		file.write("<a href='details/%s'>%d-%d</a> " % (page, first + 1, last))
+	file.write("</p>\n</body></html>\n")
+	file.close()
+
+
+"""
+Writes every row into pages of page_size rows.
+Returns [(<file name>, <first row>, <end row>), ...].
+"""
+def write_detail_pages(reader, out_dir, names, page_size):
+	pages = []
+	file = None
+	for i, row in enumerate(reader.iter_rows(names)):
+		if i % page_size == 0:
+			if file is not None:
+				end_page(file)
+			page = "page_%d.html" % (len(pages) + 1)
+			pages.append([page, i, i])
+			file = open(os.path.join(out_dir, "details", page), "w")
+			file.write("<html><head><meta charset='utf-8'>" + STYLE + "</head><body>\n")
+			file.write("<p><a href='../index.html'>Summary</a></p>\n")
+			file.write(table_header(["#"] + names))
+
+		file.write("<tr><td>%d</td>" % (i + 1)
+					+ "".join("<td>%s</td>" % format_value(name, row[name]) for name in names) + "</tr>\n")
+		pages[-1][2] = i + 1
+
+	if file is not None:
+		end_page(file)
+
+	return [tuple(page) for page in pages]
+
+def end_page(file):
+	file.write("</table>\n</body></html>\n")
+	file.close()
+
+def table_header(names):
+	return "<table>\n<tr>" + "".join("<th>%s</th>" % html.escape(name) for name in names) + "</tr>\n"
+
+def format_value(name, value):
+	if name == "timeframe" and value in Timeframes.NAMES:
+		return Timeframes.NAMES[value]
+	if value is None:
+		return "None"
+	return html.escape(str(value))
+
+def is_number_column(reader, name):
+	return column_stats(reader, name) is not None
+
+"""
+Returns (min, mean, max) of a column, or None if
+it holds anything but numbers and Nones.
+"""
+def column_stats(reader, name):
+	count, total = 0, 0
+	low, high = None, None
+	for value in reader.column(name):
+		if value is None:
+			continue
+		if not is_number(value):
+			return None
+		count += 1
+		total += value
+		low = value if low is None else min(low, value)
+		high = value if high is None else max(high, value)
+
+	if count == 0:
+		return None
+	return low, total / count, high
+
+def histogram_counts(reader, name, low, high, bins):
+	counts = [0] * bins
+	width = (high - low) / bins
+	for value in reader.column(name):
+		if value is None:
+			continue
+		i = bins - 1 if width == 0 else min(bins - 1, int((value - low) / width))
+		counts[i] += 1
+
+	return counts
+
+"""
+Returns a table of count, mean, max and share of
+positive values of metric for each value of group_by.
+"""
+def group_table(reader, group_by, metric):
+	# <group> : [<count>, <total>, <max>, <positive count>]
+	groups = {}
+	for row in reader.iter_rows([group_by, metric]):
+		value = row[metric]
+		if value is None:
+			continue
+		group = groups.setdefault(format_value(group_by, row[group_by]), [0, 0, value, 0])
+		group[0] += 1
+		group[1] += value
+		group[2] = max(group[2], value)
+		group[3] += value > 0
+
+	out = table_header([group_by, "count", metric + " mean", metric + " max", metric + " > 0"])
+	for group, (count, total, high, positive) in groups.items():
+		out += "<tr><td>%s</td><td>%d</td><td>%s</td><td>%s</td><td>%s</td></tr>\n" % (
+				group, count, round(total / count, 3), round(high, 3), round(positive / count, 3))
+	return out + "</table>\n"
+
+
+def histogram(counts, width=200, height=40):
+	bar_width = width / len(counts)
+	top = max(counts) or 1
+	bars = ["<rect x='%.1f' y='%.1f' width='%.1f' height='%.1f'/>"
+			% (i*bar_width, height - count/top*height, bar_width*0.9, count/top*height)
+			for i, count in enumerate(counts)]
+	return "<svg width='%d' height='%d'>%s</svg>" % (width, height, "".join(bars))
+
+def sparkline(points, width=120, height=24):
+	if not points or len(points) < 2:
+		return ""
+
+	low, high = min(points), max(points)
+	scale = (high - low) or 1
+	coords = ["%.1f,%.1f" % (i / (len(points) - 1) * width, height - (point - low) / scale * height)
+				for i, point in enumerate(points)]
+	return ("<svg width='%d' height='%d'><polyline fill='none' stroke='black' points='%s'/></svg>"
+			% (width, height, " ".join(coords)))
+
+STYLE = """<style>
+table { border-collapse: collapse; font-family: sans-serif; font-size: 12px; }
+td, th { border: 1px solid #ccc; padding: 2px 6px; text-align: right; }
+rect { fill: steelblue; }
+</style>"""
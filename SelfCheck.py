@@ -0,0 +1,387 @@
+"""
+Behavioural checks of the engine and the sweep
+tooling on synthetic data. Needs no MT5 terminal.
+Exits with status 1 if any check fails.
+
+python SelfCheck.py            runs every check
+python SelfCheck.py <name>...  runs the named checks
+python SelfCheck.py --make-store <root> [<days>]
+                               writes the synthetic bars
+                               into a BarStore to try tools on
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timedelta
+import Timeframes
+import WorkQueue as wq
+
+START = datetime(2019, 1, 1)
+
+"""
+Returns {<timeframe> : {<column> : <array>}} of a
+random walk, with every timeframe aggregated from
+the same H1 bars so they agree with each other.
+"""
+def synthetic_rates(days, tfs=(Timeframes.TIMEFRAME_H1, Timeframes.TIMEFRAME_H4,
+								Timeframes.TIMEFRAME_H8, Timeframes.TIMEFRAME_D1), seed=0):
+	import numpy as np
+
+	rng = np.random.default_rng(seed)
+	hours = days * 24
+	closes = 1.1 + np.cumsum(rng.normal(0, 0.0008, hours))
+	opens = np.concatenate([[1.1], closes[:-1]])
+	highs = np.maximum(opens, closes) + rng.uniform(0, 0.0005, hours)
+	lows = np.minimum(opens, closes) - rng.uniform(0, 0.0005, hours)
+	spreads = rng.integers(5, 20, hours)
+	start = int((START - datetime(1970, 1, 1)).total_seconds())
+
+	rates = {}
+	for tf in tfs:
+		step = Timeframes.DURATIONS[tf] // timedelta(hours=1)
+		count = hours // step
+		shape = (count, step)
+		rates[tf] = {'time': start + np.arange(count) * step * 3600,
+					'open': opens[::step][:count],
+					'high': highs[:count*step].reshape(shape).max(axis=1),
+					'low': lows[:count*step].reshape(shape).min(axis=1),
+					'close': closes[step-1::step][:count],
+					'tick_volume': np.full(count, step * 100),
+					'spread': spreads[:count*step].reshape(shape).min(axis=1),
+					'real_volume': np.zeros(count)}
+
+	return rates
+
+def make_store(root, days=120, seed=0):
+	import BarStore
+
+	store = BarStore.BarStore(root)
+	for tf, rates in synthetic_rates(days, seed=seed).items():
+		store.append("EURUSD", tf, rates)
+
+	return store
+
+
+def queue_job(config):
+	if config['x'] == 3:
+		raise ValueError("bad config")
+	if config['x'] == 5 and not os.path.exists(config['died']):
+		# Die without a trace the first time, like a killed worker
+		open(config['died'], "w").close()
+		os._exit(1)
+	if config['x'] == 7:
+		return {'y': object()} # not JSON serializable
+	return {'y': config['x'] * 2}
+
+def queue_worker(path, worker):
+	wq.run_worker(path, queue_job, worker=worker, lease=1, poll=0.1)
+
+"""
+Several local workers drain a queue. A job that
+raises and a job with an unserializable result end
+up failed, a job whose worker dies is retried once
+its lease expires, every other job is done once.
+"""
+def check_work_queue(tmp):
+	path = os.path.join(tmp, "queue.db")
+	queue = wq.WorkQueue(path)
+	died = os.path.join(tmp, "died")
+	queue.add_jobs([{'x': x, 'died': died} for x in range(20)])
+
+	procs = [multiprocessing.Process(target=queue_worker, args=(path, "w%d" % i)) for i in range(4)]
+	for proc in procs:
+		proc.start()
+	for proc in procs:
+		proc.join(60)
+		assert proc.exitcode is not None, "worker hung"
+
+	counts = queue.counts()
+	assert counts == {'pending': 0, 'running': 0, 'done': 18, 'failed': 2}, counts
+
+	# 5 is done by whichever worker picked it up after the lease expired
+	results = {config['x']: result['y'] for config, result in queue.results()}
+	assert results == {x: x * 2 for x in range(20) if x not in (3, 7)}, results
+	assert sorted(config['x'] for config, error in queue.failures()) == [3, 7]
+	queue.close()
+
+
+"""
+Appended bars read back the same, overlapping bars
+are skipped, ranges match a linear scan, and bytes
+left by an append that died before updating the
+header are dropped by the next append.
+"""
+def check_bar_store(tmp):
+	import numpy as np
+	import BarStore
+
+	tf = Timeframes.TIMEFRAME_H1
+	rates = synthetic_rates(30, tfs=[tf])[tf]
+	store = BarStore.BarStore(tmp)
+	first = {name: col[:400] for name, col in rates.items()}
+	assert store.append("EURUSD", tf, first) == 400
+	assert store.append("EURUSD", tf, first) == 0
+
+	# An append that wrote a column but died before the header
+	with open(os.path.join(store.series_path("EURUSD", tf), "close.bin"), "ab") as file:
+		file.write(b"garbage!" * 10)
+	assert len(store.open("EURUSD", tf)) == 400
+
+	rest = {name: col[300:] for name, col in rates.items()}
+	assert store.append("EURUSD", tf, rest) == len(rates['time']) - 400
+
+	series = store.open("EURUSD", tf)
+	assert len(series) == len(rates['time'])
+	for name, col in rates.items():
+		assert np.array_equal(series[name], col), name
+
+	start, end = datetime(2019, 1, 3, 5, 30), datetime(2019, 1, 9, 12)
+	view = series.range(start, end)
+	expected = [t for t in rates['time'] if BarStore.to_seconds(start) <= t <= BarStore.to_seconds(end)]
+	assert view['time'].tolist() == expected
+	assert isinstance(view['close'], np.memmap)
+
+
+"""
+Records, for every higher timeframe, the forming
+bar at the time that timeframe's bar closed.
+"""
+def forming_recorder(tfs):
+	import StrategySuite as ss
+
+	class FormingRecorder(ss.Strategy):
+		def __init__(self):
+			super().__init__(list(tfs))
+			self.last_forming = {tf: None for tf in self.tfs}
+			# [(<forming bar values at close>, <closed bar values>), ...]
+			self.pairs = []
+			self.errors = []
+
+		def on_new_bar(self, new_tfs):
+			lowest = self.tfs[-1]
+			if self.forming[lowest] is not None:
+				self.errors.append("lowest timeframe has a forming bar")
+
+			for tf in self.tfs[:-1]:
+				if tf in new_tfs:
+					if self.forming[tf] is not None:
+						self.errors.append("closed timeframe still forming")
+					# The forming bar took in the closing bar before it was dropped
+					last = self.last_forming[tf]
+					self.pairs.append((last and bar_values(last), bar_values(self.bars[tf][-1])))
+					self.last_forming[tf] = None
+					continue
+
+				forming = self.forming[tf]
+				if forming is None or forming.close != self.bars[lowest][-1].close:
+					self.errors.append("forming bar doesn't follow the lowest timeframe")
+				elif forming.close_time < self.bars[lowest][-1].close_time:
+					self.errors.append("forming bar ends before the lowest timeframe bar")
+				self.last_forming[tf] = forming
+
+	return FormingRecorder()
+
+def bar_values(bar):
+	return (bar.open_time, bar.close_time, round(bar.open, 10), round(bar.high, 10), round(bar.low, 10),
+			round(bar.close, 10), bar.tick_volume, bar.spread, bar.real_volume)
+
+"""
+Forming H4 and D1 bars built from H1 bars match
+the H4 and D1 bars once they close.
+"""
+def check_forming_bars(tmp):
+	import StrategySuite as ss
+
+	store = make_store(tmp, days=20)
+	strat = forming_recorder([Timeframes.TIMEFRAME_H1, Timeframes.TIMEFRAME_H4, Timeframes.TIMEFRAME_D1])
+	quiet(strat.test, "EURUSD", START, START + timedelta(days=20), calc_weekly=False, display=False, store=store)
+
+	assert not strat.errors, strat.errors[:5]
+	assert len(strat.pairs) == 20 * 6 + 20
+	for forming, closed in strat.pairs:
+		assert forming == closed, (forming, closed)
+
+"""
+Strategies on different timeframes tested together
+trade exactly as when tested one by one, and only
+see forming bars built from their own timeframes.
+"""
+def check_fan_out(tmp):
+	import BarStructureStrategy as bss
+	import StrategySuite as ss
+
+	store = make_store(tmp, days=60)
+	end = START + timedelta(days=60)
+	configs = [{'type': kind, 'struct': struct, 'wait_count': 2, 'timeframe': tf}
+				for kind in ("buy", "sell") for struct in ("top_pin", "bottom_pin")
+				for tf in (Timeframes.TIMEFRAME_H1, Timeframes.TIMEFRAME_H4, Timeframes.TIMEFRAME_D1)]
+
+	together = [bss.from_config(config) for config in configs]
+	quiet(ss.test_all, together, "EURUSD", START, end, calc_weekly=True, display=False, store=store)
+	for config, strat in zip(configs, together):
+		alone = bss.from_config(config)
+		quiet(alone.test, "EURUSD", START, end, calc_weekly=True, display=False, store=store)
+		assert strat.analyzer.stats == alone.analyzer.stats, config
+		assert strat.analyzer.weekly == alone.analyzer.weekly, config
+		assert strat.analyzer.balances == alone.analyzer.balances, config
+
+	class Watcher(ss.Strategy):
+		def __init__(self, watched):
+			super().__init__([Timeframes.TIMEFRAME_H8])
+			self.watched = watched
+			self.seen = []
+
+		def on_new_bar(self, new_tfs):
+			self.seen.append(self.watched.forming[Timeframes.TIMEFRAME_D1])
+
+	recorder = forming_recorder([Timeframes.TIMEFRAME_H8, Timeframes.TIMEFRAME_D1])
+	daily = forming_recorder([Timeframes.TIMEFRAME_D1])
+	watcher = Watcher(daily)
+	quiet(ss.test_all, [recorder, daily, watcher], "EURUSD", START, end, calc_weekly=False, display=False, store=store)
+	alone = forming_recorder([Timeframes.TIMEFRAME_H8, Timeframes.TIMEFRAME_D1])
+	quiet(alone.test, "EURUSD", START, end, calc_weekly=False, display=False, store=store)
+
+	assert not recorder.errors, recorder.errors[:5]
+	assert recorder.pairs == alone.pairs
+	# D1 is the lowest timeframe of daily, H8 bars of the others don't build it
+	assert len(watcher.seen) == 60 * 3
+	assert watcher.seen == [None] * len(watcher.seen)
+	assert not daily.errors, daily.errors[:5]
+
+def quiet(func, *args, **kwargs):
+	import contextlib
+	import io
+
+	with contextlib.redirect_stdout(io.StringIO()):
+		return func(*args, **kwargs)
+
+
+"""
+Vectorized scenario stats match the Analyzer: exactly
+for a zero cost scenario, and up to rounding for
+scenarios with costs, with break even trades mixed in.
+"""
+def check_cost_scenarios(tmp):
+	import BarStructureStrategy as bss
+	import CostModel
+	import StrategySuite as ss
+
+	store = make_store(tmp)
+	strat = bss.from_config({'type': "buy", 'struct': "top_pin", 'wait_count': 2, 'timeframe': Timeframes.TIMEFRAME_H1})
+	quiet(strat.test, "EURUSD", START, START + timedelta(days=120), calc_weekly=True, display=False, store=store)
+
+	trades = list(strat.analyzer.trades)
+	assert len(trades) > 100
+
+	analyzers = CostModel.analyze_scenarios(trades, [CostModel.CostScenario(0)], calc_weekly=True)
+	assert analyzers[0].stats == strat.analyzer.stats
+	assert analyzers[0].weekly == strat.analyzer.weekly
+	assert analyzers[0].balances == strat.analyzer.balances
+
+	# Exit at the entry price, after both a win and a loss
+	for i in (10, 11, 50):
+		trade = trades[i]
+		trades.insert(i, ss.Trade(trade.entry_time, trade.entry_price, trade.entry_price, "sell", 10, 10))
+
+	scenarios = [CostModel.CostScenario(spread_mult, commission, slippage)
+				for spread_mult in (0, 1, 2.5) for commission in (0, 0.7) for slippage in (0, 0.3)]
+	for scenario, fast in zip(scenarios, CostModel.analyze_scenarios(trades, scenarios)):
+		slow = ss.Analyzer()
+		for trade, cost in zip(trades, CostModel.cost_matrix(trades, [scenario])[0].tolist()):
+			slow.add_trade(CostModel.with_cost(trade, cost))
+		slow.analyze(calc_weekly=False, display=False)
+
+		for key, value in slow.stats.items():
+			assert abs(fast.stats[key] - value) < 0.0011, (scenario.as_dict(), key, fast.stats[key], value)
+		assert len(fast.balances) == len(slow.balances)
+		assert max(abs(a - b) for a, b in zip(fast.balances, slow.balances)) < 1e-6
+
+
+"""
+Reopening a result store appends after its flushed
+rows and drops the rest, overwriting starts over,
+and an empty store still gets a summary page.
+"""
+def check_result_writer(tmp):
+	import Reporting
+
+	path = os.path.join(tmp, "results")
+	with Reporting.ResultWriter(path, mode="w") as writer:
+		for i in range(3):
+			writer.append({"config": {'id': i}, "general_stats": {'profit': i}}, [0, i])
+
+	# A writer that died before flushing its rows
+	writer = Reporting.ResultWriter(path)
+	writer.append({"config": {'id': 99}, "general_stats": {'profit': 99, 'count': 1}})
+	for file in writer.files.values():
+		file.flush()
+
+	with Reporting.ResultWriter(path) as writer:
+		writer.append({"config": {'id': 3}, "general_stats": {'profit': 3, 'count': 5}})
+	reader = Reporting.ResultReader(path)
+	assert [row['id'] for row in reader.iter_rows()] == [0, 1, 2, 3]
+	assert list(reader.column("count")) == [None, None, None, 5]
+	assert list(reader.column(Reporting.EQUITY)) == [[0, 0], [0, 1], [0, 2], None]
+
+	out = os.path.join(tmp, "report")
+	Reporting.write_report(path, out, top_n=2)
+	with open(os.path.join(out, "index.html")) as file:
+		assert "Top 2 by profit" in file.read()
+
+	with Reporting.ResultWriter(path, mode="w") as writer:
+		writer.append({"config": {'id': 0}, "general_stats": {'count': 7}})
+	reader = Reporting.ResultReader(path)
+	assert reader.columns == ["id", "count"] and reader.rows == 1
+	assert sorted(os.listdir(path)) == ["c0.col", "c1.col", "columns.json"]
+
+	# Names that aren't file name safe, or would clash once made so
+	with Reporting.ResultWriter(path, mode="w") as writer:
+		writer.append({"config": {'a.b': 1, 'a_b': 2, 'a/b': 3}})
+	assert list(Reporting.ResultReader(path).iter_rows()) == [{'a.b': 1, 'a_b': 2, 'a/b': 3}]
+
+	# No done jobs, or nothing to sort by
+	for columns in (0, 1):
+		with Reporting.ResultWriter(path, mode="w") as writer:
+			for i in range(columns):
+				writer.append({"config": {'id': i}})
+		counts = {'pending': 0, 'running': 0, 'done': columns, 'failed': 2}
+		Reporting.write_report(path, out, counts=counts)
+		with open(os.path.join(out, "index.html")) as file:
+			page = file.read()
+		assert "%d configs tested" % columns in page and "2 failed" in page, page
+
+
+CHECKS = [check_work_queue,
+		check_bar_store,
+		check_forming_bars,
+		check_fan_out,
+		check_cost_scenarios,
+		check_result_writer]
+
+if __name__ == "__main__":
+	if sys.argv[1:2] == ["--make-store"]:
+		make_store(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 120)
+		sys.exit()
+
+	names = sys.argv[1:]
+	failed = 0
+	for check in CHECKS:
+		if names and check.__name__ not in names and check.__name__[len("check_"):] not in names:
+			continue
+
+		begin = time.perf_counter()
+		with tempfile.TemporaryDirectory() as tmp:
+			try:
+				check(tmp)
+			except Exception:
+				failed += 1
+				print(check.__name__, ": FAILED")
+				traceback.print_exc()
+				continue
+		print(check.__name__, ": ok (%.2f s)" % (time.perf_counter() - begin))
+
+	if failed:
+		sys.exit(1)
@@ -2,11 +2,14 @@
 A backtesting module inspired by MT5 strategy tester. 
 Contains relevant classes to develop and test trading strategies.
 Developed by Ahmet Oguzlu
+
+Only the standard library is imported at module load,
+so worker processes start fast and the engine runs
+anywhere. MetaTrader5 and numpy are imported when
+they are first needed.
 """
-from datetime import timedelta
-import MetaTrader5 as mt5
-import numpy as np
-import pandas as pd
+from datetime import datetime, timedelta
+import Timeframes
 
 """ 
 An interface for a strategy.
@@ -23,6 +26,11 @@ class Strategy:
 
 		# <timeframe> : [<Bar>, <Bar>, ...]
 		self.bars = {tf: [] for tf in self.tfs}
+
+		# <timeframe> : <Bar> that hasn't closed yet, or None
+		# Built by the Tester from the lowest timeframe of the
+		# strategy, so higher timeframes can be looked at intrabar.
+		self.forming = {tf: None for tf in self.tfs}
 		
 
 	""" 
@@ -50,24 +58,41 @@ class Strategy:
 	"""
 	Tests the strategy
 	""" 
-	def test(self, symbol, start_date, end_date, calc_weekly=True, display=True):
-		tester = Tester(self, symbol, start_date, end_date)
+	def test(self, symbol, start_date, end_date, calc_weekly=True, display=True, store=None):
+		tester = Tester(self, symbol, start_date, end_date, store)
 		tester.test()
 		self.analyzer.analyze(calc_weekly, display)
 
 
-	def open_position(self, _type, price, time):
-		pos = Position(_type, price, time)
+	"""
+	Prices are raw bar prices. Spreads (in points) of
+	the bars filled at are recorded with the trade, so
+	costs can be applied afterwards with CostModel.
+	"""
+	def open_position(self, _type, price, time, spread=0):
+		pos = Position(_type, price, time, spread)
 		self.positions.append(pos)
 
 
-	def close_position(self, pos, price):
+	def close_position(self, pos, price, spread=0):
 		self.positions = []
-		trade = Trade(pos.entry_time, pos.entry_price, price, pos.type)
+		trade = Trade(pos.entry_time, pos.entry_price, price, pos.type, pos.entry_spread, spread)
 		self.analyzer.add_trade(trade)
 
 
 
+"""
+Tests many strategies over one shared feed. Bars
+are gathered and walked once for all of them, and
+each strategy keeps its own Analyzer.
+"""
+def test_all(strategies, symbol, start_date, end_date, calc_weekly=True, display=True, store=None):
+	tester = Tester(strategies, symbol, start_date, end_date, store)
+	tester.test()
+	for strat in strategies:
+		strat.analyzer.analyze(calc_weekly, display)
+
+
 """
 Analyzes given history of trades
 """
@@ -145,7 +170,7 @@ class Analyzer:
 			curr_date += timedelta(days=1)
 
 			# BUG CHECK
-			if curr_date > trades[-1].entry_time:
+			if curr_date > trades[-1].entry_time.date():
 				print("Something went wrong...")
 				print("curr_date can't be later than the entry to the last trade")
 
@@ -158,6 +183,8 @@ class Analyzer:
 	incomplete weeks.
 	"""
 	def weekly_mean_dev_min_max(self, weekly_stats):
+		import numpy as np
+
 		res = {}
 		blacklist = ['win_avg', 'loss_avg', 'max_consecutive_loss', 'max_consecutive_win', 'break_even']
 		weekly_stats = weekly_stats[1:-1]
@@ -256,30 +283,57 @@ class Analyzer:
 
 
 """
-Collects data from MetaTrader 5 and feeds
-it to the Strategy passed in. After the
-test ends, performs analysis on the results.
+Collects data from MetaTrader 5, or from a
+BarStore if one is given, and feeds it to
+the Strategy passed in. After the test ends,
+performs analysis on the results.
 This class acts as the broker.
+
+A list of strategies can be passed in instead,
+possibly listening to different timeframes. Bars
+are then gathered and walked once, and each bar is
+fed only to the strategies listening to its
+timeframe.
 """
 class Tester:
-	def __init__(self, strategy, symbol, start_date, end_date):
-		self.strategy = strategy
+	def __init__(self, strategy, symbol, start_date, end_date, store=None):
+		self.strategies = strategy if isinstance(strategy, list) else [strategy]
 		self.symbol = symbol
 		self.start = start_date
 		self.end = end_date
+		self.store = store
+
+		# Every timeframe some strategy listens to
+		self.tfs = sorted({tf for strat in self.strategies for tf in strat.tfs}, reverse=True)
+
+		# <timeframe> : [<Strategy>, <Strategy>, ...] listening to it
+		self.listeners = {tf: [strat for strat in self.strategies if tf in strat.tfs] for tf in self.tfs}
+
+		# <lowest timeframe> : [<Strategy>, ...] whose lowest timeframe it is
+		self.groups = {}
+		for strat in self.strategies:
+			self.groups.setdefault(strat.tfs[-1], []).append(strat)
+
+		# <lowest timeframe> : {<higher timeframe> : <Bar> that hasn't closed yet, or None}
+		# Forming bars are built once for each lowest timeframe, so a
+		# strategy sees the same forming bars as when tested alone.
+		self.forming = {low: {tf: None for strat in strats for tf in strat.tfs[:-1]}
+						for low, strats in self.groups.items()}
 
 
 	def test(self):
-		# {<timeframe> : [Bar, Bar, ...]}
+		# {<timeframe> : <LazyBars>}
 		rates = {}
-		for tf in self.strategy.tfs:
-			raw_rates = mt5.copy_rates_range(self.symbol, tf, self.start, self.end)
-			df_rates = pd.DataFrame(raw_rates)
+		for tf in self.tfs:
+			if self.store is not None:
+				series = self.store.open(self.symbol, tf)
+				rates[tf] = LazyBars(series.range(self.start, self.end), tf)
+				continue
 
-			# convert time in seconds into the 'datetime' format
-			df_rates['time']=pd.to_datetime(df_rates['time'], unit='s')
+			import MetaTrader5 as mt5
 
-			rates[tf] = [Bar(row, tf) for index, row in df_rates.iterrows()]
+			raw_rates = mt5.copy_rates_range(self.symbol, tf, self.start, self.end)
+			rates[tf] = LazyBars({name: raw_rates[name] for name in raw_rates.dtype.names}, tf)
 
 		print("\nBars gathered for each timeframe:")
 		for k, v in rates.items():
@@ -291,16 +345,16 @@ class Tester:
 			if self.__all_bars_fed(tf_index, rates):
 				return
 
-			# Count of bars fed across all timeframes
+			# <Strategy> : [<timeframe>, ...] of the bars it was fed
 			fed_tfs = self.__feed_next_bar(tf_index, rates)
-			if len(fed_tfs) > 0:
-				self.strategy.on_new_bar(fed_tfs)
+			for strat, tfs in fed_tfs.items():
+				strat.on_new_bar(tfs)
 
 
 	"""
 	Private helper method. Returns True 
 	if we are done feeding the bars into 
-	the strategy, False otherwise.
+	the strategies, False otherwise.
 	"""
 	def __all_bars_fed(self, tf_index, rates):
 		for tf, i in tf_index.items():
@@ -311,8 +365,9 @@ class Tester:
 
 	"""
 	Private helper method. Feeds upcoming
-	bar(s) to the strategy. Returns the 
-	number of bars fed.
+	bar(s) to the strategies listening to
+	them. Returns the timeframes fed to
+	each strategy.
 	"""
 	def __feed_next_bar(self, tf_index, rates):
 		# Gather next bars of all timeframes
@@ -322,17 +377,100 @@ class Tester:
 				continue
 			potential_bars.append(rates[tf][index])
 
-		fed_tfs = []
+		fed_tfs = {}
 		# Feed the earliest (can be many if we're working on multiple timeframes)
 		earliest_time = min(potential_bars, key = lambda bar: bar.close_time).close_time
 		for bar in potential_bars:
 			if bar.close_time == earliest_time:
-				self.strategy.feed_bar(bar)
-				fed_tfs.append(bar.tf)
+				for strat in self.listeners[bar.tf]:
+					strat.feed_bar(bar)
+					fed_tfs.setdefault(strat, []).append(bar.tf)
 				tf_index[bar.tf] += 1
 
+				if bar.tf in self.groups:
+					self.__update_forming(bar)
+
+		# Higher timeframe bars that just closed aren't forming anymore
+		for bar in potential_bars:
+			if bar.close_time == earliest_time:
+				for low, forming in self.forming.items():
+					if forming.get(bar.tf) is not None:
+						forming[bar.tf] = None
+						self.__share_forming(low, bar.tf)
+
 		return fed_tfs
 
+	"""
+	Private helper method. Adds a bar into the
+	forming bars of the strategies whose lowest
+	timeframe it is, starting a new forming bar
+	if the bar falls outside of it.
+	"""
+	def __update_forming(self, bar):
+		forming = self.forming[bar.tf]
+		for tf in forming:
+			if forming[tf] is not None and forming[tf].close_time >= bar.close_time:
+				forming[tf].add_bar(bar)
+				continue
+
+			# Bars are aligned to midnight
+			duration = Timeframes.DURATIONS[tf]
+			since_midnight = timedelta(hours=bar.open_time.hour,
+										minutes=bar.open_time.minute,
+										seconds=bar.open_time.second)
+			open_time = bar.open_time - since_midnight % duration
+			forming[tf] = Bar({'time': open_time,
+								'open': bar.open,
+								'high': bar.high,
+								'low': bar.low,
+								'close': bar.close,
+								'tick_volume': bar.tick_volume,
+								'spread': bar.spread,
+								'real_volume': bar.real_volume}, tf)
+			self.__share_forming(bar.tf, tf)
+
+	"""
+	Private helper method. Hands the forming bar
+	of tf built from the lowest timeframe low to
+	the strategies of that group listening to tf.
+	Bars are only handed over when replaced, as
+	they are updated in place.
+	"""
+	def __share_forming(self, low, tf):
+		for strat in self.groups[low]:
+			if tf in strat.forming:
+				strat.forming[tf] = self.forming[low][tf]
+
+
+"""
+The bars of one timeframe over {<column> : <array>}
+where times are in seconds since epoch, as stored in
+a BarStore or returned by MT5. The arrays aren't
+copied; a Bar is only built when its index is read,
+and the last one is kept since the Tester keeps
+looking at the next bar of each timeframe until it
+is fed.
+"""
+class LazyBars:
+	def __init__(self, columns, tf):
+		self.columns = columns
+		self.tf = tf
+		self.count = len(columns['time'])
+		self.last_index = None
+		self.last_bar = None
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, index):
+		if index != self.last_index:
+			row = {name: col[index].item() for name, col in self.columns.items()}
+			row['time'] = datetime(1970, 1, 1) + timedelta(seconds=row['time'])
+			self.last_index = index
+			self.last_bar = Bar(row, self.tf)
+
+		return self.last_bar
+
 
 """
 Represents a single bar of any timeframe.
@@ -359,25 +497,10 @@ class Bar:
 		self.spread = spread
 		self.real_volume = real_volume
 		self.tf = timeframe
-		if timeframe == mt5.TIMEFRAME_D1:
-			self.close_time = self.open_time + timedelta(days=1)
-		elif timeframe == mt5.TIMEFRAME_H8:
-			self.close_time = self.open_time + timedelta(hours=8)
-		elif timeframe == mt5.TIMEFRAME_H4:
-			self.close_time = self.open_time + timedelta(hours=4)
-		elif timeframe == mt5.TIMEFRAME_H1:
-			self.close_time = self.open_time + timedelta(hours=1)
-		elif timeframe == mt5.TIMEFRAME_M30:
-			self.close_time = self.open_time + timedelta(minutes=30)
-		elif timeframe == mt5.TIMEFRAME_M15:
-			self.close_time = self.open_time + timedelta(minutes=15)
-		elif timeframe == mt5.TIMEFRAME_M5:
-			self.close_time = self.open_time + timedelta(minutes=5)
-		elif timeframe == mt5.TIMEFRAME_M1:
-			self.close_time = self.open_time + timedelta(minutes=1)
-		else:
+		if timeframe not in Timeframes.DURATIONS:
 			print("Unimplemented TF:", timeframe)
 			quit()
+		self.close_time = self.open_time + Timeframes.DURATIONS[timeframe]
 
 
 	def __str__(self):
@@ -389,6 +512,18 @@ class Bar:
 					'time': self.time,
 					'timeframe': self.tf})
 
+	"""
+	Extends the bar with a bar of a lower
+	timeframe that comes right after it.
+	"""
+	def add_bar(self, bar):
+		self.high = max(self.high, bar.high)
+		self.low = min(self.low, bar.low)
+		self.close = bar.close
+		self.tick_volume += bar.tick_volume
+		self.spread = min(self.spread, bar.spread) # lowest spread seen in the bar
+		self.real_volume += bar.real_volume
+
 	def get_oc_range(self):
 		return abs(self.open - self.close)
 
@@ -399,20 +534,23 @@ class Bar:
 Represents an open position.
 """
 class Position:
-	def __init__(self, _type, entry_price, entry_time):
+	def __init__(self, _type, entry_price, entry_time, entry_spread=0):
 		self.type = _type
 		self.entry_price = entry_price
 		self.entry_time = entry_time
+		self.entry_spread = entry_spread
 
 
 """
 Represents a completed trade.
 """
 class Trade:
-	def __init__ (self, entry_time, entry_price, exit_price, _type):
+	def __init__ (self, entry_time, entry_price, exit_price, _type, entry_spread=0, exit_spread=0):
 		self.entry_time = entry_time
 		self.entry_price = entry_price
 		self.exit_price = exit_price
+		self.entry_spread = entry_spread
+		self.exit_spread = exit_spread
 		self.profit = exit_price - entry_price
 		self.type = _type
 		if _type == "sell":
@@ -0,0 +1,36 @@
+"""
+Timeframe constants. The values are the same as
+the MetaTrader5 package's TIMEFRAME_* constants, so
+they can be used interchangeably, without importing
+MetaTrader5.
+"""
+from datetime import timedelta
+
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 1 | 0x4000
+TIMEFRAME_H4 = 4 | 0x4000
+TIMEFRAME_H8 = 8 | 0x4000
+TIMEFRAME_D1 = 24 | 0x4000
+
+# <timeframe> : <length of a bar>
+DURATIONS = {TIMEFRAME_D1: timedelta(days=1),
+			TIMEFRAME_H8: timedelta(hours=8),
+			TIMEFRAME_H4: timedelta(hours=4),
+			TIMEFRAME_H1: timedelta(hours=1),
+			TIMEFRAME_M30: timedelta(minutes=30),
+			TIMEFRAME_M15: timedelta(minutes=15),
+			TIMEFRAME_M5: timedelta(minutes=5),
+			TIMEFRAME_M1: timedelta(minutes=1)}
+
+# <timeframe> : <name>
+NAMES = {TIMEFRAME_D1: "D1",
+		TIMEFRAME_H8: "H8",
+		TIMEFRAME_H4: "H4",
+		TIMEFRAME_H1: "H1",
+		TIMEFRAME_M30: "M30",
+		TIMEFRAME_M15: "M15",
+		TIMEFRAME_M5: "M5",
+		TIMEFRAME_M1: "M1"}
@@ -0,0 +1,233 @@
+"""
+A work queue for distributed parameter sweeps.
+Jobs are JSON configs kept in a SQLite database
+that every coordinator and worker opens. Workers
+claim jobs under a lease, so a job held by a dead
+worker goes back to the queue once its lease expires.
+
+NOTE: SQLite relies on file locks. Put the database on
+storage whose locking works across hosts (a local disk
+for local workers, a properly locked network share
+otherwise).
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import utils
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue:
+	def __init__(self, path, max_attempts=3, timeout=60):
+		self.path = path
+		# A job that failed or lost its lease this many times is given up on
+		self.max_attempts = max_attempts
+
+		# Autocommit mode, transactions are opened explicitly
+		self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+		self.conn.execute("PRAGMA busy_timeout = %d" % (timeout*1000))
+		self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+								id INTEGER PRIMARY KEY,
+								config TEXT NOT NULL,
+								status TEXT NOT NULL,
+								worker TEXT,
+								lease_until REAL,
+								attempts INTEGER NOT NULL DEFAULT 0,
+								result TEXT,
+								error TEXT)""")
+		self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+	def close(self):
+		self.conn.close()
+
+	"""
+	Adds a job for each config. Configs must be
+	JSON serializable. Returns the number of jobs added.
+	"""
+	def add_jobs(self, configs):
+		rows = [(json.dumps(config), PENDING) for config in configs]
+		self.conn.execute("BEGIN IMMEDIATE")
+		self.conn.executemany("INSERT INTO jobs (config, status) VALUES (?, ?)", rows)
+		self.conn.execute("COMMIT")
+		return len(rows)
+
+	"""
+	Claims the next available job for the worker. A job
+	is available if it is pending or its lease expired.
+	Returns (job_id, config), or None if nothing is
+	available right now.
+	"""
+	def claim(self, worker, lease):
+		now = time.time()
+		self.conn.execute("BEGIN IMMEDIATE")
+		try:
+			# Expired jobs that ran out of attempts are given up on
+			self.conn.execute("""UPDATE jobs SET status = ?, error = 'lease expired'
+								WHERE status = ? AND lease_until < ? AND attempts >= ?""",
+								(FAILED, RUNNING, now, self.max_attempts))
+
+			row = self.conn.execute("""SELECT id, config FROM jobs
+									WHERE status = ? OR (status = ? AND lease_until < ?)
+									ORDER BY id LIMIT 1""",
+									(PENDING, RUNNING, now)).fetchone()
+			if row is None:
+				self.conn.execute("COMMIT")
+				return None
+
+			self.conn.execute("""UPDATE jobs SET status = ?, worker = ?, lease_until = ?,
+								attempts = attempts + 1 WHERE id = ?""",
+								(RUNNING, worker, now + lease, row[0]))
+			self.conn.execute("COMMIT")
+		except:
+			self.conn.execute("ROLLBACK")
+			raise
+
+		return row[0], json.loads(row[1])
+
+	"""
+	Extends the lease of a job the worker holds.
+	Returns False if the worker no longer holds it.
+	"""
+	def renew(self, job_id, worker, lease):
+		cur = self.conn.execute("""UPDATE jobs SET lease_until = ?
+								WHERE id = ? AND worker = ? AND status = ?""",
+								(time.time() + lease, job_id, worker, RUNNING))
+		return cur.rowcount == 1
+
+	"""
+	Stores the result of a job. Returns False if the
+	worker lost the job to another worker, in which
+	case the result is dropped.
+	"""
+	def complete(self, job_id, worker, result):
+		cur = self.conn.execute("""UPDATE jobs SET status = ?, result = ?, lease_until = NULL
+								WHERE id = ? AND worker = ? AND status = ?""",
+								(DONE, json.dumps(result, default=utils.to_builtin), job_id, worker, RUNNING))
+		return cur.rowcount == 1
+
+	"""
+	Records a failed attempt. The job is retried
+	until it runs out of attempts.
+	"""
+	def fail(self, job_id, worker, error):
+		cur = self.conn.execute("""UPDATE jobs SET
+								status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+								error = ?, lease_until = NULL
+								WHERE id = ? AND worker = ? AND status = ?""",
+								(self.max_attempts, FAILED, PENDING, error, job_id, worker, RUNNING))
+		return cur.rowcount == 1
+
+	"""
+	Returns {<status> : <job count>}.
+	"""
+	def counts(self):
+		counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+		for status, count in self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+			counts[status] = count
+		return counts
+
+	"""
+	Returns True if every job is either done or failed.
+	"""
+	def finished(self):
+		counts = self.counts()
+		return counts[PENDING] == 0 and counts[RUNNING] == 0
+
+	"""
+	Yields (config, result) for each completed job.
+	"""
+	def results(self):
+		cur = self.conn.execute("SELECT config, result FROM jobs WHERE status = ? ORDER BY id", (DONE,))
+		for config, result in cur:
+			yield json.loads(config), json.loads(result)
+
+	"""
+	Yields (config, error) for each job given up on.
+	"""
+	def failures(self):
+		cur = self.conn.execute("SELECT config, error FROM jobs WHERE status = ? ORDER BY id", (FAILED,))
+		for config, error in cur:
+			yield json.loads(config), error
+
+
+"""
+Keeps renewing the lease of a job from a background
+thread while the worker is busy running it.
+"""
+class LeaseKeeper(threading.Thread):
+	def __init__(self, path, job_id, worker, lease):
+		super().__init__(daemon=True)
+		self.path = path
+		self.job_id = job_id
+		self.worker = worker
+		self.lease = lease
+		self.stopped = threading.Event()
+
+	def run(self):
+		# sqlite connections can't be shared across threads
+		queue = WorkQueue(self.path)
+		while not self.stopped.wait(self.lease / 3):
+			if not queue.renew(self.job_id, self.worker, self.lease):
+				break
+		queue.close()
+
+	def stop(self):
+		self.stopped.set()
+		self.join()
+
+
+def default_worker_id():
+	return "%s:%d" % (socket.gethostname(), os.getpid())
+
+"""
+Runs jobs from the queue until it is finished.
+job_func takes a config and returns a JSON
+serializable result. Returns the number of jobs
+completed by this worker.
+"""
+def run_worker(path, job_func, worker=None, lease=600, poll=1.0, max_attempts=3):
+	if worker is None:
+		worker = default_worker_id()
+
+	queue = WorkQueue(path, max_attempts)
+	done = 0
+	while True:
+		claimed = queue.claim(worker, lease)
+		if claimed is None:
+			# Running jobs may still come back if their worker dies
+			if queue.finished():
+				break
+			time.sleep(poll)
+			continue
+
+		job_id, config = claimed
+		keeper = LeaseKeeper(path, job_id, worker, lease)
+		keeper.start()
+		try:
+			result = job_func(config)
+		except Exception:
+			keeper.stop()
+			queue.fail(job_id, worker, traceback.format_exc())
+			continue
+
+		keeper.stop()
+		try:
+			completed = queue.complete(job_id, worker, result)
+		except (TypeError, ValueError):
+			# The result can't be stored as JSON
+			queue.fail(job_id, worker, traceback.format_exc())
+			continue
+
+		if completed:
+			done += 1
+
+	queue.close()
+	return done
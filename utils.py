@@ -1,10 +1,13 @@
 """
 Utilities for exploration. Specifically 
 for operations with mt5 terminal.
+MetaTrader5 is only imported by the functions
+that talk to the terminal.
 """
-import MetaTrader5 as mt5
 
 def check_connection():
+	import MetaTrader5 as mt5
+
 	term_info = mt5.terminal_info()._asdict()
 
 	if not term_info['connected']:
@@ -14,6 +17,8 @@ def check_connection():
 		quit()
 
 def display_account_info():
+	import MetaTrader5 as mt5
+
 	check_connection()
 
 	acc_info = mt5.account_info()._asdict()
@@ -25,30 +30,43 @@ def display_account_info():
 
 	print("\n\n")
 
-def all_results_to_df_dict(all_results):
-	if len(all_results) < 1:
-		print("\nERROR: No results found!!\n")
-		return
-
-	df_dict = {}
-
-	for k, v in all_results[0].items():
-		for k2, v2 in v.items():
-			df_dict[k2] = []
-
-	flattened_results = []
-	for result in all_results:
-		f_res = {}
-		for k,v in result.items():
-			for k2, v2 in v.items():
-				f_res[k2] = v2
-		flattened_results.append(f_res)
-
-	for result in flattened_results:
-		for k, v in df_dict.items():
-			if k in result:
-				df_dict[k].append(result[k])
-			else:
-				df_dict[k].append("None")
-
-	return df_dict
\ No newline at end of file
+"""
+Merges the sections of a result ({"config": {...},
+"general_stats": {...}, ...}) into one flat dict.
+Sections that are None are skipped.
+"""
+def flatten_result(result):
+	flat = {}
+	for section in result.values():
+		if section is not None:
+			flat.update(section)
+
+	return flat
+
+"""
+Lets json encode numpy scalars, which show up
+in Analyzer stats.
+"""
+def to_builtin(obj):
+	if hasattr(obj, "item"):
+		return obj.item()
+	raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+"""
+Downloads bars from the terminal into a BarStore.
+Only bars newer than the ones already stored are
+appended, so this can be rerun to keep the store
+up to date.
+"""
+def download_to_store(store, symbol, tfs, start_date, end_date):
+	import MetaTrader5 as mt5
+
+	check_connection()
+
+	for tf in tfs:
+		rates = mt5.copy_rates_range(symbol, tf, start_date, end_date)
+		if rates is None:
+			print("Failed to copy rates for", symbol, tf, ":", mt5.last_error())
+			continue
+
+		print(symbol, tf, ":", store.append(symbol, tf, rates), "new bars")